@@ -8,14 +8,124 @@
 # Copyright (c) 2018 Felix Held <felix-github@felixheld.de>
 # SPDX-License-Identifier: BSD-2-Clause
 
-from functools import reduce
-from operator import xor
-from collections import OrderedDict
+from functools import lru_cache
 from math import ceil
 
 from liteeth.common import *
 
-from migen.genlib.misc import chooser, WaitTimer
+from migen.genlib.misc import WaitTimer
+
+# MAC CRC Helpers ----------------------------------------------------------------------------------
+
+# GF(2) polynoms are stored as integers (bit n is the coefficient of x^n) and reduced modulo the CRC
+# polynom (x^width + polynom).
+
+def _gf2_mul(a, b):
+    """Carry-less multiply a by b (no reduction)."""
+    r = 0
+    while b:
+        if b & 1:
+            r ^= a
+        a <<= 1
+        b >>= 1
+    return r
+
+def _gf2_div(a, b):
+    """Carry-less divide a by b (quotient only)."""
+    q = 0
+    while a.bit_length() >= b.bit_length():
+        shift = a.bit_length() - b.bit_length()
+        q ^= 1 << shift
+        a ^= b << shift
+    return q
+
+def _gf2_mulx(a, width, polynom):
+    """Multiply a by x modulo the CRC polynom (a single LFSR step)."""
+    a <<= 1
+    if (a >> width) & 1:
+        a ^= (1 << width) | polynom | 1
+    return a
+
+def _gf2_mulmod(a, b, width, polynom):
+    """Multiply a by b modulo the CRC polynom."""
+    r = 0
+    for i in reversed(range(width)):
+        r = _gf2_mulx(r, width, polynom)
+        if (b >> i) & 1:
+            r ^= a
+    return r
+
+def _gf2_xpow(n, width, polynom):
+    """Compute x^n modulo the CRC polynom (square-and-multiply)."""
+    r = 1
+    a = _gf2_mulx(1, width, polynom)
+    while n:
+        if n & 1:
+            r = _gf2_mulmod(r, a, width, polynom)
+        a = _gf2_mulmod(a, a, width, polynom)
+        n >>= 1
+    return r
+
+def _gf2_set_column(rows, col, v):
+    """Set column col of a GF(2) matrix (given as rows bitmasks) to v."""
+    while v:
+        b = v & -v
+        rows[b.bit_length()-1] |= (1 << col)
+        v ^= b
+
+@lru_cache(maxsize=None)
+def _gf2_matrix(c, width, polynom):
+    """Rows bitmasks of the GF(2) matrix multiplying a value by c modulo the CRC polynom."""
+    rows = [0]*width
+    for m in range(width):
+        _gf2_set_column(rows, m, _gf2_mulmod(c, 1 << m, width, polynom))
+    return tuple(rows)
+
+def _mask_bits(sig, m):
+    """Bits of sig selected by the bitmask m."""
+    r = []
+    while m:
+        b = m & -m
+        r.append(sig[b.bit_length()-1])
+        m ^= b
+    return r
+
+def _xor_tree(xors):
+    """XOR a list of signals as a balanced tree (log2 depth instead of a chain)."""
+    xors = list(xors)
+    while len(xors) > 1:
+        xors = [a ^ b for a, b in zip(xors[0::2], xors[1::2])] + xors[len(xors) & ~1:]
+    return xors[0]
+
+def _gf2_matrix_mul(rows, sig):
+    """Constant XOR network multiplying sig by a GF(2) matrix (given as rows bitmasks)."""
+    return Cat(*[_xor_tree(_mask_bits(sig, row)) if row else C(0, 1) for row in rows])
+
+@lru_cache(maxsize=None)
+def _crc_matrix(data_width, width, polynom):
+    """Compute the parallel implementation of a CRC's LFSR
+
+    Returns the (state_mask, din_mask) pair describing each bit of the next CRC value: bit j is the
+    XOR of the last CRC bits set in state_mask[j] and of the data bits set in din_mask[j]. Results
+    are cached since identical engines are instantiated multiple times in a design.
+
+    Clocking n data bits through the LFSR multiplies the state by x^n, so column m of the state
+    matrix is x^(n+m) and the column of data bit i is x^(n-1-i+width) (data bits are XORed with
+    the LFSR feedback), all modulo the CRC polynom: only x^k for consecutive k are needed.
+    """
+    n = data_width
+    state_mask = [0]*width
+    din_mask   = [0]*width
+    k = min(n, width)
+    v = _gf2_xpow(k, width, polynom)
+    while k < n + width:
+        if k >= n:
+            _gf2_set_column(state_mask, k - n, v)
+        if k >= width:
+            _gf2_set_column(din_mask, n - 1 - (k - width), v)
+        v = _gf2_mulx(v, width, polynom)
+        k += 1
+    return tuple(state_mask), tuple(din_mask)
 
 # MAC CRC Engine -----------------------------------------------------------------------------------
 
@@ -33,6 +143,8 @@ class LiteEthMACCRCEngine(Module):
         Width of the CRC.
     polynom : int
         Polynom of the CRC (ex: 0x04C11DB7 for IEEE 802.3 CRC)
+    partial_widths : list of int
+        Data widths for which intermediate CRC values are also provided (optional).
 
     Attributes
     ----------
@@ -42,51 +154,30 @@ class LiteEthMACCRCEngine(Module):
         last CRC value.
     next :
         next CRC value.
+    partials :
+        next CRC values computed on the first `partial_widths` bits of data input.
     """
-    def __init__(self, data_width, width, polynom):
-        self.data = Signal(data_width)
-        self.last = Signal(width)
-        self.next = Signal(width)
+    def __init__(self, data_width, width, polynom, partial_widths=()):
+        self.data     = Signal(data_width)
+        self.last     = Signal(width)
+        self.next     = Signal(width)
+        self.partials = [Signal(width) for w in partial_widths]
 
         # # #
 
-        def _optimize_eq(l):
-            """
-            remove an even numbers of XORs with the same bit
-            replace an odd number of XORs with a single XOR
-            """
-            d = OrderedDict()
-            for e in l:
-                if e in d:
-                    d[e] += 1
-                else:
-                    d[e] = 1
-            r = []
-            for key, value in d.items():
-                if value%2 != 0:
-                    r.append(key)
-            return r
-
-        # compute and optimize the parallel implementation of the CRC's LFSR
-        taps = [x for x in range(width) if (1 << x) & polynom]
-        curval = [[("state", i)] for i in range(width)]
-        for i in range(data_width):
-            feedback = curval.pop() + [("din", i)]
-            for j in range(width-1):
-                if j+1 in taps:
-                    curval[j] += feedback
-                curval[j] = _optimize_eq(curval[j])
-            curval.insert(0, feedback)
-
         # implement logic
-        for i in range(width):
-            xors = []
-            for t, n in curval[i]:
-                if t == "state":
-                    xors += [self.last[n]]
-                elif t == "din":
-                    xors += [self.data[n]]
-            self.comb += self.next[i].eq(reduce(xor, xors))
+        def _implement(sig, state_mask, din_mask):
+            for i in range(width):
+                xors  = _mask_bits(self.data, din_mask[i])
+                xors += _mask_bits(self.last, state_mask[i])
+                self.comb += sig[i].eq(_xor_tree(xors))
+
+        _implement(self.next, *_crc_matrix(data_width, width, polynom))
+        for partial, w in zip(self.partials, partial_widths):
+            if w == data_width:
+                self.comb += partial.eq(self.next)
+            else:
+                _implement(partial, *_crc_matrix(w, width, polynom))
 
 # MAC CRC32 ----------------------------------------------------------------------------------------
 
@@ -101,6 +192,9 @@ class LiteEthMACCRC32(Module):
     ----------
     data_width : int
         Width of the data bus.
+    lanes : int
+        Number of data lanes computed in parallel (optional, default to 64-bit lanes for data
+        widths >= 128-bit, a single lane otherwise).
 
     Attributes
     ----------
@@ -117,7 +211,50 @@ class LiteEthMACCRC32(Module):
     polynom = 0x04C11DB7
     init    = 2**width-1
     check   = 0xC704DD7B
-    def __init__(self, data_width):
+
+    @classmethod
+    def fold_constants(cls):
+        """Carry-less multiply folding constants
+
+        Constants used to compute the CRC on a CPU with carry-less multiplications (PCLMULQDQ
+        and similar), see crc_ref.crc32_clmul:
+        - k1/k2: x^(4*128+64)/x^(4*128) mod P, fold 4x128-bit blocks by 512 bits.
+        - k3/k4: x^(128+64)/x^128 mod P, fold a 128-bit block by 128 bits.
+        - k5/k6: x^96/x^64 mod P, reduce the last 128-bit block to 64-bit.
+        - mu: floor(x^64/P), Barrett reduction of the final 64-bit value.
+        """
+        P = (1 << cls.width) | cls.polynom
+        def xpow(n):
+            return _gf2_xpow(n, cls.width, cls.polynom)
+        return {
+            "k1" : xpow(4*128 + 64),
+            "k2" : xpow(4*128),
+            "k3" : xpow(128 + 64),
+            "k4" : xpow(128),
+            "k5" : xpow(96),
+            "k6" : xpow(64),
+            "mu" : _gf2_div(1 << 64, P),
+            "P"  : P,
+        }
+
+    @classmethod
+    def shift_by(cls, n):
+        """CRC zero extension matrix
+
+        Rows bitmasks of the GF(2) matrix updating the CRC LFSR state as if n zero bytes were
+        clocked through it (multiplication by x^(8*n) modulo the polynom), see
+        LiteEthMACCRC32ZeroExtender.
+        """
+        return _gf2_matrix(_gf2_xpow(8*n, cls.width, cls.polynom), cls.width, cls.polynom)
+
+    @classmethod
+    def model(cls, buf):
+        """Software model: IEEE 802.3 CRC of buf (slicing-by-8, see crc_ref.crc32_ref)."""
+        # Imported here: testbench only, avoids loading numpy/numba with the gateware.
+        from liteeth.mac.crc_ref import crc32_ref
+        return crc32_ref(buf)
+
+    def __init__(self, data_width, lanes=None):
         dw = data_width//8
 
         self.data  = Signal(data_width)
@@ -129,25 +266,161 @@ class LiteEthMACCRC32(Module):
 
         # # #
 
+        if lanes is None:
+            lanes = data_width//64 if data_width >= 128 else 1
+        assert data_width%(8*lanes) == 0
+
         self.comb += [
             If(self.last_be != 0,
                 last_be.eq(self.last_be)
             ).Else(
                 last_be.eq(2**(dw-1)))
         ]
+        reg = Signal(self.width, reset=self.init)
+
         # Since the data can end at any byte end, indicated by `last_be`
-        # maintain separate engines for each 8 byte increment in the data word
-        engines = [LiteEthMACCRCEngine((e+1)*8, self.width, self.polynom) for e in range(dw)]
-        self.submodules += engines
+        # provide the CRC value for each 8 byte increment in the data word.
+        if lanes == 1:
+            # From a single engine.
+            engine = LiteEthMACCRCEngine(data_width, self.width, self.polynom,
+                partial_widths = [(e+1)*8 for e in range(dw)])
+            self.submodules += engine
+
+            self.sync += reg.eq(engine.next)
+            self.comb += engine.data.eq(self.data)
+            # `engine.last` is the single buffer between the CRC register and all the partial values.
+            self.comb += engine.last.eq(reg)
+            partials = engine.partials
+        else:
+            # From `lanes` engines computing the contribution of each data lane in parallel (with a
+            # zero initial state) and stitched together with constant GF(2) multiplications: when
+            # clocking n data bits, the CRC state is multiplied by x^n modulo the polynom, so the
+            # state after lane j is S(j) = x^(j*lane_width)*reg ^ sum(x^((j-1-i)*lane_width)*lane(i))
+            # for i < j. This avoids the dense XOR matrix of a single wide engine.
+            lane_width = data_width//lanes
+            engines = [LiteEthMACCRCEngine(lane_width, self.width, self.polynom,
+                partial_widths = [(e+1)*8 for e in range(lane_width//8)]) for j in range(lanes)]
+            self.submodules += engines
+
+            def _mul_xpow(sig, n):
+                if n == 0:
+                    return sig
+                return _gf2_matrix_mul(_gf2_matrix(_gf2_xpow(n, self.width, self.polynom),
+                    self.width, self.polynom), sig)
+
+            states = [reg]
+            for j in range(1, lanes + 1):
+                state = Signal(self.width)
+                terms = [_mul_xpow(reg, j*lane_width)]
+                terms += [_mul_xpow(engines[i].next, (j-1-i)*lane_width) for i in range(j)]
+                self.comb += state.eq(_xor_tree(terms))
+                states.append(state)
+            self.sync += reg.eq(states[-1])
+
+            partials = []
+            for j in range(lanes):
+                self.comb += engines[j].data.eq(self.data[j*lane_width:(j+1)*lane_width])
+                self.comb += engines[j].last.eq(0)
+                for e, partial in enumerate(engines[j].partials):
+                    if (e+1)*8 == lane_width and j == lanes - 1:
+                        partials.append(states[-1])
+                    else:
+                        value = Signal(self.width)
+                        self.comb += value.eq(_mul_xpow(states[j], (e+1)*8) ^ partial)
+                        partials.append(value)
+
+        # Select the CRC value on `last_be` then bit-reverse/compare it only once.
+        crc_next = Signal(self.width)
+        self.comb += [If(last_be[e], crc_next.eq(partials[e])) for e in range(dw)]
+        self.comb += [
+            self.value.eq(reverse_bits(~crc_next)),
+            self.error.eq(crc_next != self.check),
+        ]
 
-        reg = Signal(self.width, reset=self.init)
-        self.sync += reg.eq(engines[-1].next)
-        self.comb += [engines[e].data.eq(self.data[:(e+1)*8]) for e in range(dw)],
-        self.comb += [engines[e].last.eq(reg) for e in range(dw)]
-        self.comb += [If(last_be[e],
-                        self.value.eq(reverse_bits(~engines[e].next)),
-                        self.error.eq(engines[e].next != self.check))
-                            for e in range(dw)]
+# MAC CRC32 Zero Extender -------------------------------------------------------------------------
+
+class LiteEthMACCRC32ZeroExtender(Module):
+    """IEEE 802.3 CRC zero extension
+
+    Update a CRC LFSR state as if n zero bytes were appended to the data, with a constant XOR
+    network instead of clocking the zeros through the LFSR.
+
+    Parameters
+    ----------
+    n : int
+        Number of zero bytes.
+
+    Attributes
+    ----------
+    last : in
+        last CRC LFSR state.
+    next : out
+        next CRC LFSR state.
+    """
+    def __init__(self, n):
+        self.last = Signal(LiteEthMACCRC32.width)
+        self.next = Signal(LiteEthMACCRC32.width)
+
+        # # #
+
+        self.comb += self.next.eq(_gf2_matrix_mul(LiteEthMACCRC32.shift_by(n), self.last))
+
+# MAC CRC32 Duplex ---------------------------------------------------------------------------------
+
+class LiteEthMACCRC32Duplex(Module):
+    """IEEE 802.3 CRC shared between TX and RX
+
+    Time-multiplex a single IEEE 802.3 CRC between a generator (TX) and a checker (RX), for
+    half-duplex designs where both directions are never active at the same time. The TX/RX sides
+    are meant to be connected to the `crc` interface of a LiteEthMACCRCInserter/Checker built with
+    external_crc.
+
+    `dir` must only be changed between packets: the inserter holds the CRC in reset while idle and
+    the checker resets it at the end of each packet, so each direction starts from a reset CRC.
+
+    Parameters
+    ----------
+    data_width : int
+        Width of the data bus.
+
+    Attributes
+    ----------
+    dir : in
+        Direction using the CRC (0: TX, 1: RX).
+    tx_data, tx_last_be, tx_ce, tx_reset : in
+        TX data input, valid byte in data input, clock enable and reset.
+    rx_data, rx_last_be, rx_ce, rx_reset : in
+        RX data input, valid byte in data input, clock enable and reset.
+    value : out
+        CRC value (used for TX).
+    error : out
+        CRC error (used for RX).
+    """
+    def __init__(self, data_width):
+        self.dir        = Signal()
+        self.tx_data    = Signal(data_width)
+        self.tx_last_be = Signal(data_width//8)
+        self.tx_ce      = Signal()
+        self.tx_reset   = Signal()
+        self.rx_data    = Signal(data_width)
+        self.rx_last_be = Signal(data_width//8)
+        self.rx_ce      = Signal()
+        self.rx_reset   = Signal()
+        self.value      = Signal(LiteEthMACCRC32.width)
+        self.error      = Signal()
+
+        # # #
+
+        crc = LiteEthMACCRC32(data_width)
+        self.submodules += crc
+        self.comb += [
+            crc.data.eq(   Mux(self.dir, self.rx_data,    self.tx_data)),
+            crc.last_be.eq(Mux(self.dir, self.rx_last_be, self.tx_last_be)),
+            crc.ce.eq(     Mux(self.dir, self.rx_ce,      self.tx_ce)),
+            crc.reset.eq(  Mux(self.dir, self.rx_reset,   self.tx_reset)),
+            self.value.eq(crc.value),
+            self.error.eq(crc.error),
+        ]
 
 # MAC CRC Inserter ---------------------------------------------------------------------------------
 
@@ -160,6 +433,9 @@ class LiteEthMACCRCInserter(Module):
     ----------
     description : description
         description of the dataflow.
+    external_crc : bool
+        Don't instantiate the CRC and let external logic (ex: a LiteEthMACCRC32Duplex shared with
+        a checker) compute it through `crc` (optional).
 
     Attributes
     ----------
@@ -167,8 +443,10 @@ class LiteEthMACCRCInserter(Module):
         Packet data without CRC.
     source : out
         Packet data with CRC.
+    crc : out/in
+        CRC interface when external_crc: data/last_be/ce/reset outputs, value input.
     """
-    def __init__(self, crc_class, description):
+    def __init__(self, crc_class, description, external_crc=False):
         self.sink   = sink = stream.Endpoint(description)
         self.source = source = stream.Endpoint(description)
 
@@ -176,14 +454,41 @@ class LiteEthMACCRCInserter(Module):
 
         dw  = len(sink.data)
         assert dw in [8, 32, 64]
-        crc = crc_class(dw)
+        if external_crc:
+            self.crc = crc = Record([
+                ("data",    dw),
+                ("last_be", dw//8),
+                ("ce",      1),
+                ("reset",   1),
+                ("value",   crc_class.width),
+            ])
+        else:
+            crc = crc_class(dw)
+            self.submodules += crc
         fsm = FSM(reset_state="IDLE")
-        self.submodules += crc, fsm
+        self.submodules += fsm
 
         # crc packet checksum
-        crc_packet = Signal(crc.width)
+        crc_packet = Signal(crc_class.width)
         last_be = Signal().like(sink.last_be)
 
+        # Last data word with its empty space filled with the beginning of the crc value: the crc
+        # value is shifted by the number of valid bytes with a barrel shifter (log2(dw/8) stages of
+        # 2-to-1 muxes) instead of selecting one of the dw/8 possible words.
+        nbytes    = dw//8
+        last_byte = Signal(max=max(nbytes, 2))
+        last_data = Signal(dw)
+        self.comb += [If(sink.last_be[e], last_byte.eq(e)) for e in range(nbytes)]
+        self.comb += last_data.eq(sink.data & Cat(*[Replicate(last_byte >= b, 8) for b in range(nbytes)]))
+        crc_shift = Signal(dw)
+        self.comb += crc_shift.eq(Cat(C(0, 8), crc.value))
+        for k in range(log2_int(nbytes)):
+            stage = Signal(dw)
+            self.comb += stage.eq(Mux(last_byte[k], Cat(C(0, 8 << k), crc_shift), crc_shift))
+            crc_shift = stage
+        last_fill = Signal(dw)
+        self.comb += last_fill.eq(last_data | crc_shift)
+
         fsm.act("IDLE",
             crc.reset.eq(1),
             sink.ready.eq(1),
@@ -202,9 +507,9 @@ class LiteEthMACCRCInserter(Module):
             If(sink.last,
                 # Fill the empty space of the last data word with the
                 # beginning of the crc value
-                [If(sink.last_be[e],
-                    source.data.eq(Cat(sink.data[:(e+1)*8],
-                        crc.value)[:dw])) for e in range(dw//8)],
+                If(sink.last_be != 0,
+                    source.data.eq(last_fill)
+                ),
                 # If the whole crc value fits in the last sink paket, signal the
                 # end. This also means the next state is idle
                 If((dw == 64) & (sink.last_be <= 0xF),
@@ -229,13 +534,17 @@ class LiteEthMACCRCInserter(Module):
                 )
             )
         )
-        ratio = crc.width//dw
+        ratio = crc_class.width//dw
         if ratio > 1:
             cnt = Signal(max=ratio, reset=ratio-1)
             cnt_done = Signal()
+            # Shift out crc_packet dw bits per beat (lower bits first), avoiding a mux on cnt.
             fsm.act("CRC",
                 source.valid.eq(1),
-                chooser(crc_packet, cnt, source.data, reverse=True),
+                source.data.eq(crc_packet[:dw]),
+                If(source.ready,
+                    NextValue(crc_packet, crc_packet >> dw)
+                ),
                 If(cnt_done,
                     source.last.eq(1),
                     If(source.ready, NextState("IDLE"))
@@ -261,8 +570,8 @@ class LiteEthMACCRCInserter(Module):
 
 
 class LiteEthMACCRC32Inserter(LiteEthMACCRCInserter):
-    def __init__(self, description):
-        LiteEthMACCRCInserter.__init__(self, LiteEthMACCRC32, description)
+    def __init__(self, description, external_crc=False):
+        LiteEthMACCRCInserter.__init__(self, LiteEthMACCRC32, description, external_crc)
 
 # MAC CRC Checker ----------------------------------------------------------------------------------
 
@@ -275,6 +584,9 @@ class LiteEthMACCRCChecker(Module):
     ----------
     description : description
         description of the dataflow.
+    external_crc : bool
+        Don't instantiate the CRC and let external logic (ex: a SoC DMA CRC sniffer) compute it
+        through `crc` (optional).
 
     Attributes
     ----------
@@ -285,62 +597,89 @@ class LiteEthMACCRCChecker(Module):
         on last when CRC OK / set to 1 when CRC KO.
     error : out
         Pulses every time a CRC error is detected.
+    bypass : in
+        Disable CRC checking (CRC is not computed and never flagged as KO). Should only be changed
+        between packets: the CRC clock enable is gated but not its reset, so toggling it during a
+        packet corrupts the CRC check of this packet.
+    crc : out/in
+        CRC interface when external_crc: data/last_be/ce/reset outputs, error input.
     """
-    def __init__(self, crc_class, description):
+    def __init__(self, crc_class, description, external_crc=False):
         self.sink   = sink   = stream.Endpoint(description)
         self.source = source = stream.Endpoint(description)
 
-        self.error = Signal()
+        self.error  = Signal()
+        self.bypass = Signal()
 
         # # #
 
         dw  = len(sink.data)
         assert dw in [8, 32, 64]
-        crc = crc_class(dw)
-        self.submodules += crc
-        ratio = ceil(crc.width/dw)
+        if external_crc:
+            self.crc = crc = Record([
+                ("data",    dw),
+                ("last_be", dw//8),
+                ("ce",      1),
+                ("reset",   1),
+                ("error",   1),
+            ])
+        else:
+            crc = crc_class(dw)
+            self.submodules += crc
+        ratio = ceil(crc_class.width/dw)
 
-        fifo = ResetInserter()(stream.SyncFIFO(description, ratio + 1))
-        self.submodules += fifo
+        # Delay the data by `ratio` words to be able to remove the CRC at the end of the packet.
+        # Words are only output once the delay line is full, so a shift register with a valid
+        # flag per stage is enough (no FIFO/level logic required).
+        delay = [stream.Endpoint(description) for _ in range(ratio)]
 
         fsm = FSM(reset_state="RESET")
         self.submodules += fsm
 
-        fifo_in   = Signal()
-        fifo_out  = Signal()
-        fifo_full = Signal()
+        delay_reset = Signal()
+        delay_in    = Signal()
+        delay_out   = Signal()
+        delay_full  = Signal()
 
         self.comb += [
-            fifo_full.eq(fifo.level == ratio),
-            fifo_in.eq(sink.valid & (~fifo_full | fifo_out)),
-            fifo_out.eq(source.valid & source.ready),
-
-            sink.connect(fifo.sink),
-            fifo.sink.valid.eq(fifo_in),
-            self.sink.ready.eq(fifo_in),
+            delay_full.eq(delay[-1].valid),
+            delay_in.eq(sink.valid & (~delay_full | delay_out)),
+            delay_out.eq(source.valid & source.ready),
+            self.sink.ready.eq(delay_in),
+        ]
+        self.sync += [
+            If(delay_reset,
+                [d.valid.eq(0) for d in delay]
+            ).Elif(delay_in,
+                sink.connect(delay[0], omit={"ready"}),
+                [delay[k-1].connect(delay[k], omit={"ready"}) for k in range(1, ratio)]
+            ).Elif(delay_out,
+                delay[-1].valid.eq(0)
+            )
         ]
 
         fsm.act("RESET",
             crc.reset.eq(1),
-            fifo.reset.eq(1),
+            delay_reset.eq(1),
             NextState("IDLE"),
         )
+        check_error = Signal()
         self.comb += [
             crc.data.eq(sink.data),
             crc.last_be.eq(sink.last_be),
+            check_error.eq(crc.error & ~self.bypass),
         ]
         fsm.act("IDLE",
             If(sink.valid & sink.ready,
-                crc.ce.eq(1),
+                crc.ce.eq(~self.bypass),
                 NextState("COPY")
             )
         )
         last_be = Signal().like(sink.last_be)
         crc_error = Signal()
         fsm.act("COPY",
-            fifo.source.ready.eq(fifo_out),
-            source.valid.eq(sink.valid & fifo_full),
-            source.payload.eq(fifo.source.payload),
+            source.valid.eq(sink.valid & delay_full),
+            source.payload.eq(delay[-1].payload),
 
             If(dw <= 32,
                 source.last.eq(sink.last),
@@ -353,18 +692,18 @@ class LiteEthMACCRCChecker(Module):
                 source.last_be.eq(sink.last_be << (dw//8 - 4)),
             ).Else(
                 NextValue(last_be, sink.last_be >> 4),
-                NextValue(crc_error, crc.error),
+                NextValue(crc_error, check_error),
             ),
 
             # `source.error` has a width > 1 for dw > 8, but since the crc error
             # applies to the whole ethernet packet, all the bytes are marked as
             # containing an error. This way later reducing the data width
             # doesn't run into issues with missing the error
-            source.error.eq(sink.error | Replicate(crc.error & sink.last, dw//8)),
-            self.error.eq(sink.valid & sink.last & crc.error),
+            source.error.eq(sink.error | Replicate(check_error & sink.last, dw//8)),
+            self.error.eq(sink.valid & sink.last & check_error),
 
             If(sink.valid & sink.ready,
-                crc.ce.eq(1),
+                crc.ce.eq(~self.bypass),
                 # Can only happen for dw == 64
                 If(sink.last & (sink.last_be > 0xF),
                    NextState("COPY_LAST"),
@@ -377,8 +716,8 @@ class LiteEthMACCRCChecker(Module):
         # If the last sink word contains both data and the crc value, shift out
         # the last value here. Can only happen for dw == 64
         fsm.act("COPY_LAST",
-            fifo.source.connect(source),
-            source.error.eq(fifo.source.error | Replicate(crc_error, dw//8)),
+            delay[-1].connect(source, omit={"ready"}),
+            source.error.eq(delay[-1].error | Replicate(crc_error, dw//8)),
             source.last_be.eq(last_be),
             If(source.valid & source.ready,
                 NextState("RESET")
@@ -387,5 +726,5 @@ class LiteEthMACCRCChecker(Module):
 
 
 class LiteEthMACCRC32Checker(LiteEthMACCRCChecker):
-    def __init__(self, description):
-        LiteEthMACCRCChecker.__init__(self, LiteEthMACCRC32, description)
+    def __init__(self, description, external_crc=False):
+        LiteEthMACCRCChecker.__init__(self, LiteEthMACCRC32, description, external_crc)
@@ -0,0 +1,117 @@
+#
+# This file is part of LiteEth.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Reference IEEE 802.3 CRC32 for testbenches/simulations.
+
+- crc32_ref: slicing-by-8 table implementation (8 bytes consumed per iteration with 8 table
+  lookups), compiled with Numba when available, pure Python otherwise.
+- crc32_clmul: carry-less multiply folding implementation, validating the constants from
+  LiteEthMACCRC32.fold_constants.
+"""
+
+from liteeth.mac.crc import LiteEthMACCRC32, _gf2_mul, _gf2_mulmod, _gf2_xpow
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Tables -------------------------------------------------------------------------------------------
+
+def _crc32_tables(polynom):
+    # Reflected (LSB first) polynom, as transmitted on Ethernet.
+    polynom = int("{:032b}".format(polynom)[::-1], 2)
+    tables  = [[0]*256 for _ in range(8)]
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ (polynom if crc & 1 else 0)
+        tables[0][i] = crc
+    for k in range(1, 8):
+        for i in range(256):
+            crc = tables[k-1][i]
+            tables[k][i] = (crc >> 8) ^ tables[0][crc & 0xff]
+    return tables
+
+_tables = _crc32_tables(polynom=0x04C11DB7) # IEEE 802.3 (LiteEthMACCRC32.polynom).
+
+_byte_reverse = [int("{:08b}".format(i)[::-1], 2) for i in range(256)]
+
+# CRC32 --------------------------------------------------------------------------------------------
+
+def _crc32_slice8(buf, t0, t1, t2, t3, t4, t5, t6, t7):
+    crc = 0xffffffff
+    n   = len(buf)
+    i   = 0
+    while i + 8 <= n:
+        crc ^= buf[i] | (buf[i+1] << 8) | (buf[i+2] << 16) | (buf[i+3] << 24)
+        crc = (t7[crc & 0xff] ^ t6[(crc >> 8) & 0xff] ^ t5[(crc >> 16) & 0xff] ^ t4[crc >> 24] ^
+               t3[buf[i+4]]   ^ t2[buf[i+5]]          ^ t1[buf[i+6]]           ^ t0[buf[i+7]])
+        i += 8
+    while i < n:
+        crc = (crc >> 8) ^ t0[(crc ^ buf[i]) & 0xff]
+        i += 1
+    return crc ^ 0xffffffff
+
+if njit is not None:
+    _crc32_slice8_jit = njit(cache=True)(_crc32_slice8)
+    _tables_np        = [np.array(t, dtype=np.int64) for t in _tables]
+
+def crc32_ref(buf):
+    """IEEE 802.3 CRC of buf (same result as binascii.crc32)."""
+    if njit is not None:
+        buf = np.frombuffer(bytes(buf), dtype=np.uint8).astype(np.int64)
+        return int(_crc32_slice8_jit(buf, *_tables_np))
+    return _crc32_slice8(bytes(buf), *_tables)
+
+# CRC32 CLMUL --------------------------------------------------------------------------------------
+
+def crc32_clmul(buf):
+    """IEEE 802.3 CRC of buf computed by carry-less multiply folding
+
+    Software model of LiteEthMACCRC32 (same result as binascii.crc32) using the constants from
+    LiteEthMACCRC32.fold_constants, mirroring what a CPU with carry-less multiplications does.
+    """
+    k    = LiteEthMACCRC32.fold_constants()
+    m64  = 2**64-1
+
+    # Convert data to a polynom (first transmitted bit as highest degree), padded with leading
+    # zeros to 128-bit blocks (which does not change its remainder).
+    data   = bytes(_byte_reverse[b] for b in buf)
+    data   = bytes(-len(data)%16) + data
+    blocks = [int.from_bytes(data[i:i+16], "big") for i in range(0, len(data), 16)]
+
+    def fold(acc, k_hi, k_lo):
+        return _gf2_mul(acc >> 64, k_hi) ^ _gf2_mul(acc & m64, k_lo)
+
+    # Fold 4 blocks in parallel by 512 bits, then the remaining blocks one by one by 128 bits.
+    acc = 0
+    if len(blocks) >= 8:
+        accs = blocks[:4]
+        i    = 4
+        while i + 4 <= len(blocks):
+            accs = [fold(accs[j], k["k1"], k["k2"]) ^ blocks[i+j] for j in range(4)]
+            i   += 4
+        acc = accs[0]
+        for a in accs[1:]:
+            acc = fold(acc, k["k3"], k["k4"]) ^ a
+        blocks = blocks[i:]
+    for b in blocks:
+        acc = fold(acc, k["k3"], k["k4"]) ^ b
+
+    # Reduce acc*x^32 to 64-bit then Barrett reduction to 32-bit.
+    r = _gf2_mul(acc >> 64, k["k5"]) ^ ((acc & m64) << 32)
+    r = _gf2_mul(r >> 64, k["k6"]) ^ (r & m64)
+    t = _gf2_mul(r >> 32, k["mu"])
+    t = _gf2_mul(t >> 32, k["P"])
+    r = (r ^ t) & (2**32-1)
+
+    # Initial value contribution.
+    w, p = LiteEthMACCRC32.width, LiteEthMACCRC32.polynom
+    r ^= _gf2_mulmod(LiteEthMACCRC32.init, _gf2_xpow(8*len(buf), w, p), w, p)
+
+    # Reflect/invert output.
+    return int("{:032b}".format(r)[::-1], 2) ^ (2**32-1)
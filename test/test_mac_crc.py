@@ -0,0 +1,264 @@
+#
+# This file is part of LiteEth.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+import binascii
+from math import ceil
+
+from migen import *
+
+from liteeth.mac.crc import LiteEthMACCRCEngine, LiteEthMACCRC32, LiteEthMACCRC32ZeroExtender
+from liteeth.mac.crc import LiteEthMACCRC32Duplex
+from liteeth.mac.crc_ref import crc32_clmul
+
+from liteeth.common import eth_phy_description
+from liteeth.mac.crc import LiteEthMACCRC32Inserter, LiteEthMACCRC32Checker
+
+# Helpers ------------------------------------------------------------------------------------------
+
+def send_packet(ep, data, error=0):
+    nbytes = len(ep.data)//8
+    words  = [data[i:i+nbytes] for i in range(0, len(data), nbytes)]
+    for n, word in enumerate(words):
+        last = (n == len(words) - 1)
+        yield ep.valid.eq(1)
+        yield ep.data.eq(int.from_bytes(word, "little"))
+        yield ep.last.eq(last)
+        yield ep.last_be.eq(1 << (len(word) - 1) if last else 0)
+        yield ep.error.eq(error)
+        yield
+        while not (yield ep.ready):
+            yield
+    yield ep.valid.eq(0)
+    # Let the DUT return to idle between packets.
+    for i in range(4):
+        yield
+
+@passive
+def receive_packets(ep, packets):
+    # Append a (data, error) tuple to packets for each received packet.
+    nbytes = len(ep.data)//8
+    data   = b""
+    error  = 0
+    yield ep.ready.eq(1)
+    while True:
+        yield
+        if (yield ep.valid) and (yield ep.ready):
+            word  = (yield ep.data).to_bytes(nbytes, "little")
+            error |= (yield ep.error)
+            if (yield ep.last):
+                last_be = (yield ep.last_be)
+                data += word[:last_be.bit_length()] if last_be else word
+                packets.append((data, error))
+                data  = b""
+                error = 0
+            else:
+                data += word
+
+
+class TestMACCRC(unittest.TestCase):
+    def crc32_test(self, data_width, datas, **kwargs):
+        dut   = LiteEthMACCRC32(data_width, **kwargs)
+        nbytes = data_width//8
+        def generator(dut):
+            for data in datas:
+                yield dut.reset.eq(1)
+                yield
+                yield dut.reset.eq(0)
+                words = [data[i:i+nbytes] for i in range(0, len(data), nbytes)]
+                for n, word in enumerate(words):
+                    last = (n == len(words) - 1)
+                    yield dut.data.eq(int.from_bytes(word, "little"))
+                    yield dut.last_be.eq(1 << (len(word) - 1) if last else 0)
+                    yield dut.ce.eq(not last)
+                    yield
+                self.assertEqual((yield dut.value), LiteEthMACCRC32.model(data))
+        run_simulation(dut, generator(dut))
+
+    def test_crc32(self):
+        prng = random.Random(42)
+        for data_width in [8, 32, 64]:
+            datas = [bytes(prng.randrange(256) for _ in range(n)) for n in range(1, 24)]
+            self.crc32_test(data_width, datas)
+
+    def test_crc32_lanes(self):
+        prng = random.Random(42)
+        for data_width, lanes in [(64, 2), (128, None), (256, None)]:
+            datas = [bytes(prng.randrange(256) for _ in range(n)) for n in [1, 7, 8, 9, 31, 32, 33, 70]]
+            self.crc32_test(data_width, datas, lanes=lanes)
+
+    def test_crc32_zero_extender(self):
+        prng = random.Random(42)
+        for n in [1, 3, 8, 100]:
+            dut = Module()
+            dut.submodules.extender = extender = LiteEthMACCRC32ZeroExtender(n)
+            dut.submodules.engine   = engine   = LiteEthMACCRCEngine(8*n, 32, LiteEthMACCRC32.polynom)
+            def generator(dut):
+                for i in range(8):
+                    last = prng.getrandbits(32)
+                    yield extender.last.eq(last)
+                    yield engine.last.eq(last)
+                    yield
+                    self.assertEqual((yield extender.next), (yield engine.next))
+            run_simulation(dut, generator(dut))
+
+    def test_crc32_duplex(self):
+        prng = random.Random(42)
+        data = bytes(prng.randrange(256) for _ in range(64))
+        dut  = LiteEthMACCRC32Duplex(32)
+        def feed(dut, direction, data):
+            # Feed data in one direction while driving the other one with garbage.
+            other = {"tx": "rx", "rx": "tx"}[direction]
+            yield getattr(dut, other + "_ce").eq(1)
+            yield getattr(dut, other + "_data").eq(prng.getrandbits(32))
+            yield dut.dir.eq(direction == "rx")
+            yield getattr(dut, direction + "_reset").eq(1)
+            yield
+            yield getattr(dut, direction + "_reset").eq(0)
+            for i in range(0, len(data), 4):
+                last = (i + 4 >= len(data))
+                yield getattr(dut, direction + "_data").eq(int.from_bytes(data[i:i+4], "little"))
+                yield getattr(dut, direction + "_ce").eq(not last)
+                yield
+        def generator(dut):
+            # TX: generate the CRC.
+            yield from feed(dut, "tx", data)
+            crc = (yield dut.value)
+            self.assertEqual(crc, LiteEthMACCRC32.model(data))
+            # RX: check the CRC.
+            yield from feed(dut, "rx", data + crc.to_bytes(4, "little"))
+            self.assertEqual((yield dut.error), 0)
+            # RX: check a corrupted FCS.
+            yield from feed(dut, "rx", data + (crc ^ 0x100).to_bytes(4, "little"))
+            self.assertEqual((yield dut.error), 1)
+        run_simulation(dut, generator(dut))
+
+    def test_crc32_duplex_inserter_checker(self):
+        class DUT(Module):
+            def __init__(self, dw):
+                self.submodules.inserter = LiteEthMACCRC32Inserter(eth_phy_description(dw), external_crc=True)
+                self.submodules.checker  = LiteEthMACCRC32Checker(eth_phy_description(dw), external_crc=True)
+                self.submodules.duplex   = duplex = LiteEthMACCRC32Duplex(dw)
+                self.comb += [
+                    duplex.tx_data.eq(self.inserter.crc.data),
+                    duplex.tx_last_be.eq(self.inserter.crc.last_be),
+                    duplex.tx_ce.eq(self.inserter.crc.ce),
+                    duplex.tx_reset.eq(self.inserter.crc.reset),
+                    self.inserter.crc.value.eq(duplex.value),
+                    duplex.rx_data.eq(self.checker.crc.data),
+                    duplex.rx_last_be.eq(self.checker.crc.last_be),
+                    duplex.rx_ce.eq(self.checker.crc.ce),
+                    duplex.rx_reset.eq(self.checker.crc.reset),
+                    self.checker.crc.error.eq(duplex.error),
+                ]
+
+        prng = random.Random(42)
+        for dw in [8, 32, 64]:
+            dut   = DUT(dw)
+            datas = [bytes(prng.randrange(256) for _ in range(n)) for n in [16, 21, 30, 47]]
+            tx_packets = []
+            rx_packets = []
+            def generator(dut):
+                for n, data in enumerate(datas):
+                    # TX: append the FCS.
+                    yield dut.duplex.dir.eq(0)
+                    yield
+                    yield from send_packet(dut.inserter.sink, data)
+                    while len(tx_packets) <= n:
+                        yield
+                    frame = tx_packets[n][0]
+                    self.assertEqual(frame, data + LiteEthMACCRC32.model(data).to_bytes(4, "little"))
+                    # RX: check/remove the FCS, corrupt odd frames.
+                    if n%2:
+                        frame = bytes([frame[0] ^ 1]) + frame[1:]
+                    yield dut.duplex.dir.eq(1)
+                    yield
+                    yield from send_packet(dut.checker.sink, frame)
+                    while len(rx_packets) <= n:
+                        yield
+            run_simulation(dut, [generator(dut),
+                receive_packets(dut.inserter.source, tx_packets),
+                receive_packets(dut.checker.source,  rx_packets)])
+            self.assertEqual(len(rx_packets), len(datas))
+            for n, (data, error) in enumerate(rx_packets):
+                self.assertEqual(data, bytes([datas[n][0] ^ (n%2)]) + datas[n][1:])
+                self.assertEqual(error != 0, n%2 == 1)
+
+    def test_checker_external_crc(self):
+        prng = random.Random(42)
+        dut  = LiteEthMACCRC32Checker(eth_phy_description(32), external_crc=True)
+        datas   = [bytes(prng.randrange(256) for _ in range(n)) for n in [16, 21]]
+        packets = []
+        stats   = {"ce": 0, "reset": 0, "error": 0}
+        def generator(dut):
+            for data, crc_error in zip(datas, [0, 1]):
+                # CRC is checked externally: drive crc.error, the FCS content does not matter.
+                yield dut.crc.error.eq(crc_error)
+                yield from send_packet(dut.sink, data + bytes(4))
+        @passive
+        def monitor(dut):
+            while True:
+                transfer = (yield dut.sink.valid) & (yield dut.sink.ready)
+                # crc.ce pulses on each accepted word and crc.data/last_be follow the sink.
+                self.assertEqual((yield dut.crc.ce), transfer)
+                if transfer:
+                    self.assertEqual((yield dut.crc.data), (yield dut.sink.data))
+                    self.assertEqual((yield dut.crc.last_be), (yield dut.sink.last_be))
+                if (yield dut.source.valid) and not (yield dut.source.last):
+                    self.assertEqual((yield dut.source.error), 0)
+                stats["ce"]    += (yield dut.crc.ce)
+                stats["reset"] += (yield dut.crc.reset)
+                stats["error"] += (yield dut.error)
+                yield
+        run_simulation(dut, [generator(dut), monitor(dut), receive_packets(dut.source, packets)])
+        # Data without FCS, crc.error reported on source.error (all bytes) of the last beat.
+        self.assertEqual(packets, [(datas[0], 0b0000), (datas[1], 0b1111)])
+        self.assertEqual(stats["ce"], sum(ceil((len(d) + 4)/4) for d in datas))
+        # crc.reset pulses once at startup and once after each packet.
+        self.assertEqual(stats["reset"], len(datas) + 1)
+        # error pulses once, on the last beat of the KO packet.
+        self.assertEqual(stats["error"], 1)
+
+    def test_checker_bypass(self):
+        prng = random.Random(42)
+        for dw in [8, 32, 64]:
+            dut   = LiteEthMACCRC32Checker(eth_phy_description(dw))
+            datas = [bytes(prng.randrange(256) for _ in range(n)) for n in [16, 21, 30]]
+            fcs   = [LiteEthMACCRC32.model(d).to_bytes(4, "little") for d in datas]
+            fcs[0] = bytes(4) # Bad FCS.
+            packets = []
+            errors  = []
+            def generator(dut):
+                yield dut.bypass.eq(1)
+                yield from send_packet(dut.sink, datas[0] + fcs[0])
+                yield from send_packet(dut.sink, datas[1] + fcs[1], error=1)
+                # Bad FCS not bypassed anymore.
+                yield dut.bypass.eq(0)
+                yield from send_packet(dut.sink, datas[0] + fcs[0])
+            @passive
+            def monitor(dut):
+                while True:
+                    errors.append((yield dut.error))
+                    yield
+            run_simulation(dut, [generator(dut), monitor(dut), receive_packets(dut.source, packets)])
+            # CRC word removed, CRC error not reported in bypass, sink.error still forwarded.
+            self.assertEqual([d for d, e in packets], [datas[0], datas[1], datas[0]])
+            self.assertEqual(packets[0][1], 0)
+            self.assertNotEqual(packets[1][1], 0)
+            self.assertNotEqual(packets[2][1], 0)
+            self.assertEqual(sum(errors), 1)
+
+    def test_crc32_clmul(self):
+        prng = random.Random(42)
+        for n in list(range(128)) + [1500]:
+            data = bytes(prng.randrange(256) for _ in range(n))
+            self.assertEqual(crc32_clmul(data), binascii.crc32(data))
+
+    def test_crc32_model(self):
+        prng = random.Random(42)
+        for n in list(range(128)) + [1500]:
+            data = bytes(prng.randrange(256) for _ in range(n))
+            self.assertEqual(LiteEthMACCRC32.model(data), binascii.crc32(data))